@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+from functools import lru_cache
+
 from ..pid import PID
 from . import CrcMoose3 as crc
 
@@ -79,15 +81,36 @@ def crc5_sof(v):
     return eval('0b' + bin(reg.getFinalValue() | 0x10000000)[::-1][:5])
 
 
+def _make_crc16_table():
+    # 256-entry lookup table for the reflected CRC-16/USB polynomial
+    # (0x8005, reflected form 0xa001), built once at import time.
+    table = []
+    for byte in range(256):
+        reg = byte
+        for _ in range(8):
+            if reg & 1:
+                reg = (reg >> 1) ^ 0xa001
+            else:
+                reg >>= 1
+        table.append(reg)
+    return table
+
+
+_CRC16_TABLE = _make_crc16_table()
+
+
 def crc16(input_data):
     # width=16 poly=0x8005 init=0xffff refin=true refout=true xorout=0xffff check=0xb4c8 residue=0xb001 name="CRC-16/USB"
     # CRC appended low byte first.
-    reg = crc.CrcRegister(crc.CRC16_USB)
+    # Table-driven: one lookup per byte instead of the CrcRegister's
+    # bit-by-bit shifting, as crc16 runs for every data packet sent or
+    # checked by the testbenches.
+    reg = 0xffff
     for d in input_data:
         assert d <= 0xff, input_data
-        reg.takeWord(d, 8)
-    crc16 = reg.getFinalValue()
-    return [crc16 & 0xff, (crc16 >> 8) & 0xff]
+        reg = (reg >> 8) ^ _CRC16_TABLE[(reg ^ d) & 0xff]
+    reg ^= 0xffff
+    return [reg & 0xff, (reg >> 8) & 0xff]
 
 
 def nrzi(data, cycles=4, init="J"):
@@ -162,6 +185,41 @@ def eop():
     return "__j"
 
 
+def _make_nrzi_table():
+    # Byte-at-a-time NRZI + bit stuffing: for every (line state, running
+    # ones count, input byte) precompute the encoded output chunk and the
+    # carry-out state, so wrap_packet can walk a packet eight bits per
+    # lookup instead of branching per bit in nrzi().
+    table = {}
+    for state in 'JK':
+        for ones in range(6):
+            for byte in range(256):
+                bits = format(byte, '08b')
+                out = []
+                s, n = state, ones
+                for bit in bits:
+                    if bit == '1':
+                        n += 1
+                    else:
+                        s = 'K' if s == 'J' else 'J'
+                        n = 0
+                    out.append(s)
+                    if n > 5:
+                        # Stuffed 0 after six consecutive 1s.
+                        s = 'K' if s == 'J' else 'J'
+                        n = 0
+                        out.append(s)
+                table[state, ones, bits] = (''.join(out), s, n)
+    return table
+
+_NRZI_TABLE = _make_nrzi_table()
+
+
+# The packet constructors below are pure functions of their arguments, and
+# the testbenches rebuild the same packets over and over (every handshake is
+# an identical ACK/NAK); memoize them so repeats are a dict hit instead of
+# another CRC + NRZI + bit-stuffing pass.
+@lru_cache(maxsize=2048)
 def wrap_packet(data, cycles=4):
     """Add the sync + eop sections and do nrzi encoding.
 
@@ -175,9 +233,25 @@ def wrap_packet(data, cycles=4):
     'KJKJKJKKKKJKJKKKKJKJKJKJJKJKJKJJJJJJJKKKJ__J'
 
     """
+    # Every packet the constructors above produce is a whole number of
+    # plain 0/1 bytes, which the byte-wide NRZI table handles directly;
+    # anything fancier (spaces, pre-encoded j/k/_ states) falls back to
+    # the bitwise nrzi() path.
+    if len(data) % 8 == 0 and not data.strip('01'):
+        out = [sync().upper()]
+        state, ones = 'K', 0
+        for i in range(0, len(data), 8):
+            enc, state, ones = _NRZI_TABLE[state, ones, data[i:i + 8]]
+            out.append(enc)
+        out.append('__J')
+        encoded = ''.join(out)
+        if cycles != 1:
+            encoded = ''.join(c * cycles for c in encoded)
+        return encoded
     return nrzi(sync() + data + eop(), cycles)
 
 
+@lru_cache(maxsize=2048)
 def token_packet(pid, addr, endp):
     """Create a token packet for testing.
 
@@ -236,10 +310,18 @@ def data_packet(pid, payload):
 
     """
     assert pid in (PID.DATA0, PID.DATA1), pid
+    # Payloads arrive as lists; convert to a hashable tuple at the boundary
+    # so repeated packets hit the cache.
+    return _data_packet(pid, tuple(payload))
+
+
+@lru_cache(maxsize=2048)
+def _data_packet(pid, payload):
     payload = list(payload)
     return encode_pid(pid) + encode_data(payload + crc16(payload))
 
 
+@lru_cache(maxsize=2048)
 def handshake_packet(pid):
     """ Create a handshake packet for testing.
 
@@ -255,6 +337,7 @@ def handshake_packet(pid):
     return encode_pid(pid)
 
 
+@lru_cache(maxsize=2048)
 def sof_packet(frame):
     """Create a SOF packet for testing.
 
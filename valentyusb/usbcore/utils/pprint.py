@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
 
+from functools import lru_cache
+
 from .packet import *
 from ..pid import *
 
 
+# Pure function of its arguments; the testbenches pretty-print the same
+# expected packets (notably ACK handshakes) for every transaction, so cache
+# the rendered form.
+@lru_cache(maxsize=2048)
 def pp_packet(p, cycles=4):
     """
     >>> print(pp_packet(wrap_packet(handshake_packet(PID.ACK), cycles=1), cycles=1))